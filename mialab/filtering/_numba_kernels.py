@@ -0,0 +1,24 @@
+"""Numba kernels of the pre-processing filters.
+
+This module requires numba and is therefore only imported on first use by :mod:`filtering.preprocessing`.
+"""
+import numba
+import numpy as np
+
+
+# numpy error model and no 'nnan'/'ninf' fast-math flags, such that a zero variance results in NaN
+@numba.njit(parallel=True, fastmath={'reassoc', 'contract', 'nsz'}, cache=True, error_model='numpy')
+def zscore(in_arr, out_arr):
+    """Z-score normalizes a flat array into a flat float32 array of the same size."""
+    n = in_arr.size
+    sum_ = 0.0
+    sum_squares = 0.0
+    for i in numba.prange(n):
+        value = np.float64(in_arr[i])
+        sum_ += value
+        sum_squares += value * value
+
+    mean = sum_ / n
+    inv_std = 1.0 / np.sqrt(max(sum_squares / n - mean * mean, 0.0))
+    for i in numba.prange(n):
+        out_arr[i] = (in_arr[i] - mean) * inv_std
@@ -3,8 +3,10 @@
 All modules in the filter package implement the basic IFilter interface and can be used to set up a pipeline.
 """
 from abc import ABCMeta, abstractmethod
+import itertools
 from typing import List
 
+import numpy as np
 import SimpleITK as sitk
 
 
@@ -96,3 +98,84 @@ class FilterPipeline:
             string += ' ' + str(filter_no + 1) + '. ' + '    '.join(str(filter_).splitlines(True))
 
         return string.format(self=self)
+
+
+class TiledPipeline(FilterPipeline):
+    """Represents a filter pipeline, which is executed tile by tile on images.
+
+    Each tile is extended by a halo and passed through all filters before the next tile is processed, which keeps
+    the working set small enough to stay in the CPU cache. The halo must be at least the largest filter radius
+    (e.g. three times the sigma in voxels for a gaussian filter) to avoid artifacts at the tile borders.
+
+    Note that only filters with a bounded neighbourhood (e.g. smoothing filters) give the same result as on the whole
+    image. Filters relying on global image statistics, like the z-score normalization or the bias field correction,
+    must not be tiled. Filters changing the image size or geometry, like registration or resampling, can not be
+    tiled either. Image-specific parameters are passed unchanged to the filters of each tile.
+    """
+
+    def __init__(self, filters: List[IFilter]=None, tile_size: int=128, halo: int=16):
+        """Initializes a new instance of the `TiledPipeline` class.
+
+        Args:
+            filters (list of IFilter): The filters.
+            tile_size (int): The tile size in voxels along each dimension.
+            halo (int): The number of voxels by which each tile is extended on each side.
+        """
+        super().__init__(filters)
+        self.tile_size = tile_size
+        self.halo = halo
+
+    def execute(self, image: sitk.Image) -> sitk.Image:
+        """Executes the filter pipeline tile by tile on an image.
+
+        Args:
+            image (sitk.Image): The image.
+
+        Returns:
+            sitk.Image: The filtered image.
+        """
+        size = image.GetSize()
+        out_arr = None
+        out_tile = None
+
+        # the tiles are assembled in a numpy array since sitk.Paste copies the whole destination image for each tile
+        for tile_index in itertools.product(*(range(0, s, self.tile_size) for s in size)):
+            tile_size = [min(self.tile_size, s - i) for i, s in zip(tile_index, size)]
+            roi_index = [max(i - self.halo, 0) for i in tile_index]
+            roi_end = [min(i + t + self.halo, s) for i, t, s in zip(tile_index, tile_size, size)]
+
+            roi = sitk.RegionOfInterest(image, [e - i for i, e in zip(roi_index, roi_end)], roi_index)
+            out_tile = super().execute(roi)
+            if out_tile.GetSize() != roi.GetSize():
+                raise ValueError('The filters must not change the image size to be executed tile by tile')
+            tile_arr = sitk.GetArrayViewFromImage(out_tile)
+
+            if out_arr is None:
+                out_arr = np.empty(tuple(reversed(size)) + tile_arr.shape[len(size):], tile_arr.dtype)
+
+            # crop the halo and copy the tile (numpy arrays are indexed in reversed order, i.e. z, y, x)
+            dst = tuple(slice(i, i + t) for i, t in zip(tile_index, tile_size))[::-1]
+            src = tuple(slice(i - r, i - r + t) for i, r, t in zip(tile_index, roi_index, tile_size))[::-1]
+            out_arr[dst] = tile_arr[src]
+
+        img_out = sitk.GetImageFromArray(out_arr, isVector=out_tile.GetNumberOfComponentsPerPixel() > 1)
+        img_out.CopyInformation(image)
+        return img_out
+
+    def __str__(self):
+        """Gets a printable string representation.
+
+        Returns:
+            str: String representation.
+        """
+
+        string = 'TiledPipeline:\n' \
+                 ' tile_size: {self.tile_size}\n' \
+                 ' halo:      {self.halo}\n' \
+            .format(self=self)
+
+        for filter_no, filter_ in enumerate(self.filters):
+            string += ' ' + str(filter_no + 1) + '. ' + '    '.join(str(filter_).splitlines(True))
+
+        return string
+
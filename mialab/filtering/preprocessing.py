@@ -1,11 +1,65 @@
 """Enables the enhancement of images before their use with other algorithms."""
+import functools
+from typing import Callable, List
+
 import SimpleITK as sitk
 import numpy as np
+from pathos import multiprocessing as pmp
+from pathos.helpers import mp as pmp_helpers
 
+import mialab.data.conversion as conversion
 import mialab.filtering.filter as fltr
 import pickle
 from medpy.filter import IntensityRangeStandardization
+from medpy.filter.IntensityRangeStandardization import InformationLossException, SingleIntensityAccumulationError
+
+try:
+    import cv2  # optional, provides SIMD kernels for some of the array-based filters
+except ImportError:
+    cv2 = None
+
+
+@functools.lru_cache(maxsize=None)
+def _load_zscore_numba():
+    """Imports the parallel numba z-score kernel (optional) on first use.
+
+    Returns:
+        callable: The kernel ``zscore(in_arr, out_arr)`` working on flat arrays, or None if numba is not installed.
+    """
+    try:
+        from mialab.filtering._numba_kernels import zscore
+    except ImportError:
+        return None
+    return zscore
+
+
+@functools.lru_cache(maxsize=None)
+def _is_cupy_available() -> bool:
+    """Imports CuPy (optional) on first use and checks whether it can be used.
+
+    Returns:
+        bool: True if CuPy is installed and a CUDA device is available; otherwise, False.
+    """
+    try:
+        import cupy
+    except ImportError:
+        return False
+    return cupy.cuda.is_available()
+
 
+def _image_from_array(array: np.ndarray, reference: sitk.Image) -> sitk.Image:
+    """Converts an array to an image with the same origin, spacing, and direction as a reference image.
+
+    Args:
+        array (np.ndarray): The array with the same shape as the reference image's array.
+        reference (sitk.Image): The image to copy the spatial information from.
+
+    Returns:
+        sitk.Image: The image.
+    """
+    image = sitk.GetImageFromArray(array, isVector=reference.GetNumberOfComponentsPerPixel() > 1)
+    image.CopyInformation(reference)
+    return image
 
 
 class BiasFieldCorrectorParams(fltr.IFilterParams):
@@ -30,11 +84,11 @@ class BiasFieldCorrector(fltr.IFilter):
 
     def __init__(self, shrink_factor=1, convergence_threshold=0.001, max_iterations=(50, 50, 50, 50),
                  fullwidth_at_halfmax = 0.15, fiter_noise=0.01, histogram_bins=200, control_points=(4,4,4),
-                 spline_order=3):
+                 spline_order=3, number_of_threads: int=None):
         """Initializes a new instance of the BiasFieldCorrector class.
 
         Args:
-            shrink_factor (float): The shrink factor. A higher factor decreases the computational time.
+            shrink_factor (int): The shrink factor. A higher factor decreases the computational time.
             convergence_threshold (float): The threshold to stop the optimizer.
             max_iterations (list of int): The maximum number of optimizer iterations at each level.
             fullwidth_at_halfmax (float): ?
@@ -42,6 +96,8 @@ class BiasFieldCorrector(fltr.IFilter):
             histogram_bins (int): Number of histogram bins.
             control_points (list of int): The number of spline control points.
             spline_order (int): The spline order.
+            number_of_threads (int): The number of threads used by ITK. Defaults to ITK's global default, which can
+                be set by the environment variable ``ITK_GLOBAL_DEFAULT_NUMBER_OF_THREADS``.
         """
         super().__init__()
         self.shrink_factor = shrink_factor
@@ -52,10 +108,39 @@ class BiasFieldCorrector(fltr.IFilter):
         self.histogram_bins = histogram_bins
         self.control_points = control_points
         self.spline_order = spline_order
+        self.number_of_threads = number_of_threads
+
+        # configure the filter and the string representation once instead of on every call
+        self._corrector = sitk.N4BiasFieldCorrectionImageFilter()
+        self._corrector.SetConvergenceThreshold(self.convergence_threshold)
+        self._corrector.SetMaximumNumberOfIterations([int(i) for i in self.max_iterations])
+        self._corrector.SetBiasFieldFullWidthAtHalfMaximum(self.fullwidth_at_halfmax)
+        self._corrector.SetWienerFilterNoise(self.filter_noise)
+        self._corrector.SetNumberOfHistogramBins(self.histogram_bins)
+        self._corrector.SetNumberOfControlPoints([int(p) for p in self.control_points])
+        self._corrector.SetSplineOrder(self.spline_order)
+        self._corrector.SetNumberOfThreads(self.number_of_threads if self.number_of_threads is not None
+                                           else sitk.ProcessObject.GetGlobalDefaultNumberOfThreads())
+        self._shrink = int(self.shrink_factor) if self.shrink_factor > 1 else None
+
+        self._str = 'BiasFieldCorrector:\n' \
+                    ' shrink_factor:         {self.shrink_factor}\n' \
+                    ' convergence_threshold: {self.convergence_threshold}\n' \
+                    ' max_iterations:        {self.max_iterations}\n' \
+                    ' fullwidth_at_halfmax:  {self.fullwidth_at_halfmax}\n' \
+                    ' filter_noise:          {self.filter_noise}\n' \
+                    ' histogram_bins:        {self.histogram_bins}\n' \
+                    ' control_points:        {self.control_points}\n' \
+                    ' spline_order:          {self.spline_order}\n' \
+                    ' number_of_threads:     {self.number_of_threads}\n' \
+            .format(self=self)
 
     def execute(self, image: sitk.Image, params: BiasFieldCorrectorParams=None) -> sitk.Image:
         """Executes a bias field correction on an image.
 
+        If the shrink factor is larger than one, the bias field is estimated on the shrunk image and mask,
+        and the full resolution image is corrected with the bias field evaluated at full resolution.
+
         Args:
             image (sitk.Image): The image.
             params (BiasFieldCorrectorParams): The bias field correction filter parameters.
@@ -65,11 +150,14 @@ class BiasFieldCorrector(fltr.IFilter):
         """
 
         mask = params.mask if params is not None else sitk.OtsuThreshold(image, 0, 1, 200)
-        if self.shrink_factor > 1:
-            raise ValueError('shrinking is not supported yet')
-        return sitk.N4BiasFieldCorrection(image, mask, self.convergence_threshold, self.max_iterations,
-                                          self.fullwidth_at_halfmax, self.filter_noise, self.histogram_bins,
-                                          self.control_points, self.spline_order)
+
+        if self._shrink is not None:
+            shrink = [self._shrink] * image.GetDimension()
+            self._corrector.Execute(sitk.Shrink(image, shrink), sitk.Shrink(mask, shrink))
+            log_bias_field = sitk.Cast(self._corrector.GetLogBiasFieldAsImage(image), image.GetPixelID())
+            return sitk.Divide(image, sitk.Exp(log_bias_field))  # keeps the pixel type, unlike the / operator
+
+        return self._corrector.Execute(image, mask)
 
     def __str__(self):
         """Gets a printable string representation.
@@ -77,16 +165,7 @@ class BiasFieldCorrector(fltr.IFilter):
         Returns:
             str: String representation.
         """
-        return 'BiasFieldCorrector:\n' \
-               ' shrink_factor:         {self.shrink_factor}\n' \
-               ' convergence_threshold: {self.convergence_threshold}\n' \
-               ' max_iterations:        {self.max_iterations}\n' \
-               ' fullwidth_at_halfmax:  {self.fullwidth_at_halfmax}\n' \
-               ' filter_noise:          {self.filter_noise}\n' \
-               ' histogram_bins:        {self.histogram_bins}\n' \
-               ' control_points:        {self.control_points}\n' \
-               ' spline_order:          {self.spline_order}\n' \
-            .format(self=self)
+        return self._str
 
 
 class GradientAnisotropicDiffusion(fltr.IFilter):
@@ -121,7 +200,10 @@ class GradientAnisotropicDiffusion(fltr.IFilter):
         Returns:
             sitk.Image: The smoothed image.
         """
-        return sitk.GradientAnisotropicDiffusion(sitk.Cast(image, sitk.sitkFloat32),
+        if image.GetPixelID() != sitk.sitkFloat32:
+            image = sitk.Cast(image, sitk.sitkFloat32)
+
+        return sitk.GradientAnisotropicDiffusion(image,
                                                  self.time_step,
                                                  self.conductance,
                                                  self.conductance_scaling_update_interval,
@@ -144,9 +226,19 @@ class GradientAnisotropicDiffusion(fltr.IFilter):
 class NormalizeZScore(fltr.IFilter):
     """Represents a z-score normalization filter."""
 
-    def __init__(self):
-        """Initializes a new instance of the NormalizeZScore class."""
+    NUMBA_MIN_VOXELS = 2000000  # images with more voxels are normalized in parallel if numba is available
+
+    def __init__(self, use_gpu: bool=False):
+        """Initializes a new instance of the NormalizeZScore class.
+
+        Args:
+            use_gpu (bool): Normalize on the GPU using CuPy. Falls back to the CPU if CuPy is not installed or no
+                CUDA device is available.
+        """
         super().__init__()
+        self.use_gpu = use_gpu
+        self._gpu = use_gpu and _is_cupy_available()
+        self._scratch = None  # output buffer reused as long as the image shape does not change
 
     def execute(self, image: sitk.Image, params: fltr.IFilterParams=None) -> sitk.Image:
         """Executes a z-score normalization on an image.
@@ -159,16 +251,107 @@ class NormalizeZScore(fltr.IFilter):
             sitk.Image: The normalized image.
         """
 
-        img_arr = sitk.GetArrayFromImage(image)
+        img_arr = sitk.GetArrayViewFromImage(image)  # zero-copy, read-only view on the ITK buffer
+
+        if self._scratch is None or self._scratch.shape != img_arr.shape:
+            if self._gpu:
+                import cupyx
+                # pinned (page-locked) host memory speeds up the copy from the GPU
+                self._scratch = cupyx.empty_pinned(img_arr.shape, np.float32)
+            else:
+                self._scratch = np.empty(img_arr.shape, np.float32)
+        out = self._scratch
+
+        if self._gpu:
+            self._normalize_cupy(img_arr, out)
+        elif img_arr.dtype in (np.uint8, np.uint16):
+            self._normalize_lut(img_arr, out)
+        elif img_arr.size > NormalizeZScore.NUMBA_MIN_VOXELS and _load_zscore_numba() is not None:
+            _load_zscore_numba()(img_arr.ravel(), out.ravel())
+        elif cv2 is not None and img_arr.dtype == np.float32:
+            self._normalize_cv2(img_arr, out)
+        else:
+            self._normalize_numpy(img_arr, out)
+
+        return _image_from_array(out, image)  # copies the buffer, hence the scratch buffer can be reused
+
+    @staticmethod
+    def _normalize_numpy(img_arr: np.ndarray, out: np.ndarray):
+        """Z-score normalizes an array with NumPy.
+
+        Args:
+            img_arr (np.ndarray): The image array.
+            out (np.ndarray): The float32 array of the same shape to write the normalized values to.
+        """
+        # sum and sum of squares in float64 to avoid the precision loss of a float32 accumulator
+        flat = img_arr.ravel()
+        n = flat.size
+        mean = flat.sum(dtype=np.float64) / n
+        variance = np.einsum('i,i->', flat, flat, dtype=np.float64) / n - mean * mean
+        inv_std = 1.0 / np.sqrt(max(variance, 0.0))
+
+        np.subtract(img_arr, mean, out=out, casting='unsafe')
+        np.multiply(out, inv_std, out=out, casting='unsafe')
+
+    @staticmethod
+    def _normalize_lut(img_arr: np.ndarray, out: np.ndarray):
+        """Z-score normalizes an integer array with a look-up table.
 
-        mean = img_arr.mean()
-        std = img_arr.std()
-        img_arr = (img_arr - mean) / std
+        The moments are computed from the intensity histogram and each of the (at most 65536) intensities is
+        normalized only once. Note that :func:`numpy.bincount` and :func:`numpy.take` cast the intensities to
+        ``np.intp`` internally, i.e. each allocates a temporary index array of the image size (64-bit integers).
 
-        img_out = sitk.GetImageFromArray(img_arr.astype(np.float32))
-        img_out.CopyInformation(image)
+        Args:
+            img_arr (np.ndarray): The image array of type uint8 or uint16.
+            out (np.ndarray): The float32 array of the same shape to write the normalized values to.
+        """
+        histogram = np.bincount(img_arr.ravel()).astype(np.float64)
+        intensities = np.arange(histogram.size, dtype=np.float64)
+        n = img_arr.size
+        mean = histogram.dot(intensities) / n
+        std = np.sqrt(histogram.dot(np.square(intensities - mean)) / n)
+
+        lut = ((intensities - mean) / std).astype(np.float32)
+        if cv2 is not None and img_arr.dtype == np.uint8:
+            lut = np.pad(lut, (0, 256 - lut.size), 'constant')  # cv2.LUT requires exactly 256 entries
+            mat = img_arr.reshape(-1, img_arr.shape[-1])
+            cv2.LUT(mat, lut, dst=out.reshape(mat.shape))
+        else:
+            # the indices are in range by construction, and mode='clip' lets numpy write directly to out
+            # (the default mode='raise' buffers out in a temporary array of the image size)
+            np.take(lut, img_arr, out=out, mode='clip')
 
-        return img_out
+    @staticmethod
+    def _normalize_cupy(img_arr: np.ndarray, out: np.ndarray):
+        """Z-score normalizes an array on the GPU with CuPy.
+
+        Args:
+            img_arr (np.ndarray): The image array.
+            out (np.ndarray): The float32 array of the same shape to write the normalized values to.
+        """
+        import cupy as cp
+
+        arr_gpu = cp.asarray(img_arr)
+        mean = arr_gpu.mean(dtype=cp.float64)
+        inv_std = 1.0 / arr_gpu.std(dtype=cp.float64)
+        ((arr_gpu - mean) * inv_std).astype(cp.float32).get(out=out)
+
+    @staticmethod
+    def _normalize_cv2(img_arr: np.ndarray, out: np.ndarray):
+        """Z-score normalizes an array with OpenCV.
+
+        The result differs from :meth:`_normalize_numpy` by about 5e-8, since OpenCV scales in single precision.
+
+        Args:
+            img_arr (np.ndarray): The image array of type float32.
+            out (np.ndarray): The float32 array of the same shape to write the normalized values to.
+        """
+        mat = img_arr.reshape(-1, img_arr.shape[-1])  # OpenCV operates on 2-D matrices
+        mean, std_dev = cv2.meanStdDev(mat)
+        mean, inv_std = mean[0, 0], 1.0 / std_dev[0, 0]
+
+        # (x - mean) * inv_std in one pass, written directly as float32 (no saturation for integer inputs)
+        cv2.addWeighted(mat, inv_std, mat, 0.0, -mean * inv_std, dst=out.reshape(mat.shape), dtype=cv2.CV_32F)
 
     def __str__(self):
         """Gets a printable string representation.
@@ -177,6 +360,7 @@ class NormalizeZScore(fltr.IFilter):
             str: String representation.
         """
         return 'NormalizeZScore:\n' \
+               ' use_gpu: {self.use_gpu}\n' \
             .format(self=self)
 
 
@@ -184,17 +368,39 @@ class Gaussian(fltr.IFilter):
     """Represents a gaussian filter."""
 
     def __init__(self,
-                 sigma: int=1):
-        """Initializes a new instance of the Gaussian class."""
+                 sigma: int=1,
+                 number_of_work_units: int=None,
+                 normalize_across_scale: bool=False):
+        """Initializes a new instance of the Gaussian class.
+
+        Args:
+            sigma (int): The standard deviation of the gaussian in physical units.
+            number_of_work_units (int): The number of pieces the image is split into for the multi-threaded execution
+                (requires ITK 5 threading). Defaults to ITK's choice.
+            normalize_across_scale (bool): Normalize the output such that it is comparable across different sigmas.
+        """
         super().__init__()
         self.sigma = sigma
+        self.number_of_work_units = number_of_work_units
+        self.normalize_across_scale = normalize_across_scale
+
+        self._flt = sitk.SmoothingRecursiveGaussianImageFilter()
+        self._flt.SetSigma(self.sigma)
+        self._flt.SetNormalizeAcrossScale(self.normalize_across_scale)
+        if self.number_of_work_units is not None:
+            self._flt.SetNumberOfWorkUnits(self.number_of_work_units)
 
     def execute(self, image: sitk.Image, params: fltr.IFilterParams=None) -> sitk.Image:
+        """Executes a gaussian smoothing on an image.
 
-        gaussian = sitk.SmoothingRecursiveGaussianImageFilter()
-        gaussian.SetSigma(self.sigma)
+        Args:
+            image (sitk.Image): The image.
+            params (fltr.IFilterParams): The parameters (unused).
 
-        return gaussian.Execute(image)
+        Returns:
+            sitk.Image: The smoothed image.
+        """
+        return self._flt.Execute(image)
 
     def __str__(self):
         """Gets a printable string representation.
@@ -203,6 +409,9 @@ class Gaussian(fltr.IFilter):
             str: String representation.
         """
         return 'Gaussian:\n' \
+               ' sigma:                  {self.sigma}\n' \
+               ' number_of_work_units:   {self.number_of_work_units}\n' \
+               ' normalize_across_scale: {self.normalize_across_scale}\n' \
             .format(self=self)
 
 
@@ -210,17 +419,61 @@ class Median(fltr.IFilter):
     """Represents a median filter."""
 
     def __init__(self,
-                 radius: int=1):
-        """Initializes a new instance of the Median class."""
+                 radius: int=1,
+                 slice_wise: bool=False):
+        """Initializes a new instance of the Median class.
+
+        Args:
+            radius (int): The radius of the neighbourhood in voxels.
+            slice_wise (bool): Filter three-dimensional images slice by slice (2-D median) with OpenCV if possible,
+                which is considerably faster than the 3-D median of ITK.
+        """
         super().__init__()
         self.radius = radius
+        self.slice_wise = slice_wise
+
+        self._flt = sitk.MedianImageFilter()
+        self._flt.SetRadius(self.radius)
 
     def execute(self, image: sitk.Image, params: fltr.IFilterParams=None) -> sitk.Image:
+        """Executes a median filtering on an image.
+
+        Two-dimensional (or, if slice-wise, three-dimensional) scalar images are filtered with OpenCV if available
+        and supported by ``cv2.medianBlur``, i.e. for uint8 images and for uint16 images with a radius up to two.
+        All other images are filtered with ITK.
+
+        Args:
+            image (sitk.Image): The image.
+            params (fltr.IFilterParams): The parameters (unused).
+
+        Returns:
+            sitk.Image: The filtered image.
+        """
+        if cv2 is not None and isinstance(self.radius, int) and image.GetNumberOfComponentsPerPixel() == 1 \
+                and (image.GetDimension() == 2 or (image.GetDimension() == 3 and self.slice_wise)):
+            img_arr = sitk.GetArrayViewFromImage(image)
+            if img_arr.dtype == np.uint8 or (img_arr.dtype == np.uint16 and self.radius <= 2):
+                return _image_from_array(self._median_cv2(img_arr), image)
 
-        median = sitk.MedianImageFilter()
-        median.SetRadius(self.radius)
+        return self._flt.Execute(image)
 
-        return median.Execute(image)
+    def _median_cv2(self, img_arr: np.ndarray) -> np.ndarray:
+        """Median filters a two-dimensional array, or a three-dimensional array slice by slice, with OpenCV.
+
+        Args:
+            img_arr (np.ndarray): The image array of type uint8 or uint16.
+
+        Returns:
+            np.ndarray: The filtered array.
+        """
+        kernel_size = 2 * self.radius + 1
+        if img_arr.ndim == 2:
+            return cv2.medianBlur(img_arr, kernel_size)
+
+        out = np.empty_like(img_arr)
+        for slice_no in range(img_arr.shape[0]):
+            out[slice_no] = cv2.medianBlur(img_arr[slice_no], kernel_size)
+        return out
 
     def __str__(self):
         """Gets a printable string representation.
@@ -229,6 +482,8 @@ class Median(fltr.IFilter):
             str: String representation.
         """
         return 'Median:\n' \
+               ' radius:     {self.radius}\n' \
+               ' slice_wise: {self.slice_wise}\n' \
             .format(self=self)
 
 
@@ -331,29 +586,118 @@ class HistogramMatcher(fltr.IFilter):
 class IRS(fltr.IFilter):
     """Represents a intensity range standardization filter implemented with Medpy."""
 
-    def __init__(self, model_path='bin/mia-model/hmmModel.pkl', train=False):
-        """Initializes a new instance of the HistMatcher class."""
+    _models = {}  # trained models already loaded in this process, where the key is the model path
+
+    def __init__(self, model_path='bin/mia-model/hmmModel.pkl', train=False, surpress_mapping_check=False):
+        """Initializes a new instance of the HistMatcher class.
+
+        Args:
+            model_path (str): The path to the model.
+            train (bool): Collect images to train a model instead of transforming them.
+            surpress_mapping_check (bool): Skip MedPy's check whether an image can be transformed to the standard
+                intensity space without loss of information.
+        """
         super().__init__()
         self.model_path = model_path
         self.train = train
+        self.surpress_mapping_check = surpress_mapping_check
 
         if self.train:
             self.train_images = []
             self.irs = IntensityRangeStandardization()
         else:
-            with open(model_path, 'r') as f:
-                self.irs = pickle.load(f)
+            if model_path not in IRS._models:
+                with open(model_path, 'rb') as f:
+                    IRS._models[model_path] = pickle.load(f)
+            self.irs = IRS._models[model_path]
+            self._set_landmarks()
 
     def execute(self, image: sitk.Image, params: fltr.IFilterParams=None) -> sitk.Image:
-        img_array = sitk.GetArrayFromImage(image)
+        """Executes an intensity range standardization on an image.
+
+        In training mode, the image is only collected and returned unchanged. Call :meth:`finalize` once all
+        training images have been executed to train and save the model.
+
+        Args:
+            image (sitk.Image): The image.
+            params (fltr.IFilterParams): The parameters (unused).
+
+        Returns:
+            sitk.Image: The standardized image.
+        """
+        img_array = sitk.GetArrayViewFromImage(image)  # zero-copy, read-only view on the ITK buffer
         if self.train:
-            self.train_images.append(img_array)
-            self.irs.train(self.train_images)
-            with open(self.model_path, 'wb') as f:
-                pickle.dump(self.irs, f)
+            # flat float32 copy (the view must not outlive the image), which MedPy does not need to flatten again
+            self.train_images.append(img_array.astype(np.float32).ravel())
             return image
         else:
-            return sitk.Image(self.irs.transform(img_array), sitk.sitkUInt8)
+            return _image_from_array(self._transform(img_array).astype(np.uint8), image)
+
+    def finalize(self):
+        """Trains the model on all collected training images and saves it to the model path."""
+        if not self.train:
+            raise ValueError('IRS is not in training mode')
+
+        self.irs.train(self.train_images)
+        with open(self.model_path, 'wb') as f:
+            pickle.dump(self.irs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        IRS._models.pop(self.model_path, None)  # a model loaded before from this path is outdated
+        self._set_landmarks()
+
+    def _set_landmarks(self):
+        """Precomputes the landmark percentiles and the standard intensities they map to from the trained model."""
+        self._landmarks_p = [self.irs.cutoffp[0]] + list(self.irs.landmarkp) + [self.irs.cutoffp[1]]
+        self._landmarks_out = np.asarray(self.irs.model, dtype=np.float64)
+
+    def _transform(self, img_array: np.ndarray) -> np.ndarray:
+        """Maps the intensities of an image to the standard intensity space.
+
+        Equivalent to MedPy's ``IntensityRangeStandardization.transform``, but the piecewise-linear mapping is
+        evaluated with a single :func:`numpy.interp` instead of one pass per segment.
+
+        Args:
+            img_array (np.ndarray): The image array.
+
+        Returns:
+            np.ndarray: The standardized image array (float64).
+
+        Raises:
+            SingleIntensityAccumulationError: If landmark percentiles of the image are equal.
+            InformationLossException: If the image can not be transformed without loss of information.
+        """
+        landmarks_in = np.percentile(img_array, self._landmarks_p)
+        landmarks_out = self._landmarks_out
+
+        if np.unique(landmarks_in).size != landmarks_in.size:
+            raise SingleIntensityAccumulationError('The image shows a single intensity accumulation, which leads to '
+                                                   'equal percentile values. This is usually caused by a background, '
+                                                   'which has not been removed from the image.')
+
+        # MedPy's information loss check compares the landmark distances with the trained model
+        if not self.surpress_mapping_check and \
+                not self.irs._IntensityRangeStandardization__check_mapping(landmarks_in):
+            raise InformationLossException('The image can not be transformed to the learned standard intensity space '
+                                           'without loss of information. Please re-train the model.')
+
+        # MedPy extrapolates the outermost segments, whereas np.interp clamps outside the landmarks.
+        # Hence, extend the landmarks by the extrapolated image minimum and maximum
+        min_, max_ = float(img_array.min()), float(img_array.max())
+        if min_ < landmarks_in[0]:
+            slope = (landmarks_out[1] - landmarks_out[0]) / (landmarks_in[1] - landmarks_in[0])
+            out_min = landmarks_out[0] + (min_ - landmarks_in[0]) * slope
+            landmarks_in = np.concatenate(([min_], landmarks_in))
+            landmarks_out = np.concatenate(([out_min], landmarks_out))
+        if max_ > landmarks_in[-1]:
+            slope = (landmarks_out[-1] - landmarks_out[-2]) / (landmarks_in[-1] - landmarks_in[-2])
+            out_max = landmarks_out[-1] + (max_ - landmarks_in[-1]) * slope
+            landmarks_in = np.concatenate((landmarks_in, [max_]))
+            landmarks_out = np.concatenate((landmarks_out, [out_max]))
+
+        if img_array.dtype in (np.uint8, np.uint16):
+            # map each possible intensity only once
+            lut = np.interp(np.arange(int(max_) + 1), landmarks_in, landmarks_out)
+            return lut[img_array]
+        return np.interp(img_array, landmarks_in, landmarks_out)
 
     def __str__(self):
         """Gets a printable string representation.
@@ -364,20 +708,71 @@ class IRS(fltr.IFilter):
         return 'IRS:\n' \
                ' model_path:         {self.model_path}\n' \
                ' train:             {self.train}\n' \
+               ' surpress_mapping_check: {self.surpress_mapping_check}\n' \
             .format(self=self)
 
 
 class Bilateral(fltr.IFilter):
     """Represents a bilateral filter."""
 
-    def __init__(self, domainSigma=4.0, rangeSigma=50.0):
-        """Initializes a new instance of the bilateral class."""
+    def __init__(self, domainSigma=4.0, rangeSigma=50.0, use_opencv=False):
+        """Initializes a new instance of the bilateral class.
+
+        Args:
+            domainSigma (float): The standard deviation of the spatial gaussian in physical units.
+            rangeSigma (float): The standard deviation of the intensity gaussian.
+            use_opencv (bool): Filter two-dimensional images with OpenCV if possible, which is considerably faster
+                than ITK but only approximates ITK's result (OpenCV uses a circular instead of a rectangular
+                neighbourhood and computes in single precision).
+        """
         super().__init__()
         self.domainSigma = domainSigma
         self.rangeSigma = rangeSigma
+        self.use_opencv = use_opencv
+
+        self._flt = sitk.BilateralImageFilter()
+        self._flt.SetDomainSigma(self.domainSigma)
+        self._flt.SetRangeSigma(self.rangeSigma)
 
     def execute(self, image: sitk.Image, params: fltr.IFilterParams=None) -> sitk.Image:
-        return sitk.Bilateral(image, domainSigma=self.domainSigma, rangeSigma=self.rangeSigma)
+        """Executes a bilateral filtering on an image.
+
+        If OpenCV is enabled and available, two-dimensional scalar images (or volumes with a single slice) with
+        isotropic in-plane spacing are filtered with OpenCV.
+
+        Args:
+            image (sitk.Image): The image.
+            params (fltr.IFilterParams): The parameters (unused).
+
+        Returns:
+            sitk.Image: The filtered image.
+        """
+        if self.use_opencv and cv2 is not None and image.GetNumberOfComponentsPerPixel() == 1:
+            in_plane_spacing = [spacing for spacing, size in zip(image.GetSpacing(), image.GetSize()) if size > 1]
+            if len(in_plane_spacing) == 2 and np.isclose(in_plane_spacing[0], in_plane_spacing[1]):
+                return self._execute_cv2(image, in_plane_spacing[0])
+
+        return self._flt.Execute(image)
+
+    def _execute_cv2(self, image: sitk.Image, spacing: float) -> sitk.Image:
+        """Executes a bilateral filtering on a two-dimensional image with OpenCV.
+
+        Args:
+            image (sitk.Image): The image with exactly two dimensions of size larger than one.
+            spacing (float): The in-plane spacing to convert the domain sigma from physical units to pixels.
+
+        Returns:
+            sitk.Image: The filtered image.
+        """
+        img_arr = sitk.GetArrayViewFromImage(image)
+        slice_ = np.squeeze(img_arr).astype(np.float32)
+
+        # match ITK's kernel radius (2.5 sigma in pixels) and boundary condition (zero flux Neumann)
+        sigma_space = self.domainSigma / spacing
+        diameter = 2 * int(np.ceil(2.5 * sigma_space)) + 1
+        out = cv2.bilateralFilter(slice_, diameter, self.rangeSigma, sigma_space, borderType=cv2.BORDER_REPLICATE)
+
+        return _image_from_array(out.reshape(img_arr.shape).astype(img_arr.dtype, copy=False), image)
 
     def __str__(self):
         """Gets a printable string representation.
@@ -388,4 +783,52 @@ class Bilateral(fltr.IFilter):
         return 'Bilateral:\n' \
                ' domainSigma:         {self.domainSigma}\n' \
                ' rangeSigma:             {self.rangeSigma}\n' \
+               ' use_opencv:          {self.use_opencv}\n' \
             .format(self=self)
+
+
+def execute_pipeline_batch(pipeline_factory: Callable[[], fltr.FilterPipeline], paths: List[str],
+                           processes: int=None) -> List[sitk.Image]:
+    """Executes a filter pipeline on multiple images in parallel, with one process per image.
+
+    ITK is restricted to a single thread in each worker process, since parallelizing over images scales better
+    than ITK's multi-threading within a single image. Note that each worker holds its image and the intermediate
+    images of the pipeline, i.e. the memory usage grows with the number of processes.
+
+    The worker processes are spawned instead of forked, since forking after the numba kernel of
+    :class:`NormalizeZScore` has started its (TBB) thread pool hangs the process. Hence, scripts calling this function
+    must guard their entry point with ``if __name__ == '__main__':``.
+
+    Args:
+        pipeline_factory (callable): A picklable function creating the pipeline. The pipeline is created in the
+            worker process since the filters hold SimpleITK objects, which cannot be pickled.
+        paths (list of str): The paths to the images. The images are read in the worker processes.
+        processes (int): The number of processes. Defaults to the number of CPUs.
+
+    Returns:
+        list of sitk.Image: The filtered images in the order of the paths.
+    """
+    with pmp.Pool(processes, initializer=_set_single_threaded_itk, context=pmp_helpers.get_context('spawn')) as pool:
+        ret_vals = pool.map(functools.partial(_execute_pipeline, pipeline_factory), paths)
+
+    return [conversion.NumpySimpleITKImageBridge.convert(np_img, image_properties)
+            for np_img, image_properties in ret_vals]
+
+
+def _set_single_threaded_itk():
+    """Restricts ITK to a single thread in the calling (worker) process."""
+    sitk.ProcessObject.SetGlobalDefaultNumberOfThreads(1)
+
+
+def _execute_pipeline(pipeline_factory: Callable[[], fltr.FilterPipeline], path: str):
+    """Reads an image and executes the pipeline on it.
+
+    Args:
+        pipeline_factory (callable): A function creating the pipeline.
+        path (str): The path to the image.
+
+    Returns:
+        tuple: The filtered image as numpy array and its image properties (picklable).
+    """
+    image = pipeline_factory().execute(sitk.ReadImage(path))
+    return conversion.SimpleITKNumpyImageBridge.convert(image)
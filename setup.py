@@ -16,7 +16,7 @@ REQUIRED_PACKAGES = [
     'numpy >= 1.13.1',
     'Pillow >= 4.2.1',
     'pydensecrf >= 1.0rc1',
-    'SimpleITK >= 1.0.1',
+    'SimpleITK >= 2.0.0',
     'sphinx >= 1.6',
     'sphinx_rtd_theme >= 0.2.4',
     'tensorflow == 1.2.1',